@@ -1,7 +1,11 @@
 # https://claude.ai/chat/230fd208-927f-4f7e-b646-9d96c72c542e
 
 import os
-import requests
+import asyncio
+import functools
+import aiohttp
+import orjson
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
 from datetime import datetime, timedelta
 from typing import List, Dict
 from dotenv import load_dotenv
@@ -13,12 +17,30 @@ from google.cloud import secretmanager
 import functions_framework
 from flask import Request
 
-@dataclass
+MAX_CONCURRENT_REQUESTS = 5
+REQUEST_TIMEOUT_SECONDS = 30
+CONNECTION_POOL_SIZE = 10
+DNS_CACHE_TTL_SECONDS = 300
+MAX_MESSAGES_PER_SMTP_CONNECTION = 100
+MAX_REQUEST_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 0.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Few rows survive the min_load_date filter, so small pages keep payloads
+# lean; pagination picks up any overflow
+FEC_PAGE_SIZE = 20
+# Upper bound on pages fetched per query, so a misbehaving cursor can't
+# burn through the API quota
+MAX_FEC_PAGES = 50
+
+# HTML for one contribution row: date, amount, committee, employer, load date
+ROW_TEMPLATE = "<tr><td>{0}</td><td>${1:,.2f}</td><td>{2}</td><td>{3}</td><td>{4}</td></tr>"
+
+@dataclass(slots=True, frozen=True)
 class Contributor:
     name: str
     employer: str = None
     
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Contribution:
     date: datetime
     amount: float
@@ -26,117 +48,312 @@ class Contribution:
     employer: str
     committee_name: str
     load_date: datetime
+    # Display strings, formatted once at parse time for the email body
+    date_str: str
+    load_date_str: str
 
+@functools.lru_cache(maxsize=1)
+def get_secret_client() -> secretmanager.SecretManagerServiceClient:
+    """Return a Secret Manager client shared across warm invocations."""
+    return secretmanager.SecretManagerServiceClient()
+
+@functools.lru_cache(maxsize=8)
 def get_secret(secret_id: str) -> str:
-    """Retrieve secret from Google Cloud Secret Manager."""
-    client = secretmanager.SecretManagerServiceClient()
+    """
+    Retrieve secret from Google Cloud Secret Manager.
+    
+    Values are cached for the lifetime of the instance; call
+    get_secret.cache_clear() to pick up a rotated secret.
+    """
+    client = get_secret_client()
     name = f"projects/{os.environ['SECRET_PROJECT_ID']}/secrets/{secret_id}/versions/latest"
     response = client.access_secret_version(request={"name": name})
     return response.payload.data.decode("UTF-8")
 
-def get_fec_contributions(contributor: Contributor, api_key: str, days_back_load: int = 14, days_back_contrib: int = 180) -> List[Contribution]:
+async def get_secrets(*secret_ids: str) -> List[str]:
+    """
+    Retrieve several secrets concurrently.
+    
+    Each lookup runs get_secret in a worker thread so the gRPC calls overlap
+    while still sharing the cached client and values.
+    """
+    # Build the client on this thread first; lru_cache doesn't lock, so
+    # concurrent first calls from the workers would each construct one
+    get_secret_client()
+    return await asyncio.gather(*(asyncio.to_thread(get_secret, secret_id) for secret_id in secret_ids))
+
+def build_date_params(days_back_load: int = 14, days_back_contrib: int = 180) -> Dict[str, str]:
     """
-    Fetch contributions from FEC API for a given contributor.
+    Build the FEC date filters for a run, formatted once up front.
     
     Args:
-        contributor: Contributor object containing name and employer
-        api_key: FEC API key
         days_back_load: Number of days back to check for load_date
         days_back_contrib: Number of days back to search for contributions
     """
-    base_url = "https://api.open.fec.gov/v1/schedules/schedule_a/"
-    
-    # Calculate date ranges
     end_date = datetime.now()
     contrib_start_date = end_date - timedelta(days=days_back_contrib)
     min_load_date = end_date - timedelta(days=days_back_load)
     
-    params = {
-        'api_key': api_key,
-        'contributor_name': contributor.name,
-        'contributor_employer': contributor.employer,
+    return {
         'min_date': contrib_start_date.strftime('%m/%d/%Y'),
         'max_date': end_date.strftime('%m/%d/%Y'),
+        # Only return contributions loaded after min_load_date
+        'min_load_date': min_load_date.strftime('%m/%d/%Y'),
+    }
+
+def name_tokens(name: str) -> frozenset:
+    """Normalize a name into a set of upper-case tokens, ignoring order and commas."""
+    return frozenset(name.upper().replace(',', ' ').split())
+
+def name_matches(target_tokens: frozenset, result_tokens: frozenset) -> bool:
+    """Whether every target token is a prefix of some result token (so JEN matches JENNIFER)."""
+    return all(any(token.startswith(target) for token in result_tokens) for target in target_tokens)
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Whether a failed FEC request is worth retrying."""
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status in RETRY_STATUSES
+    return isinstance(exc, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+def log_retry(retry_state):
+    """Log a failed attempt before tenacity backs off and retries it."""
+    print(f"Retrying FEC request (attempt {retry_state.attempt_number} failed): {retry_state.outcome.exception()}")
+
+async def fetch_json(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, url: str, params: dict) -> dict:
+    """GET a JSON document, retrying transient failures with exponential backoff."""
+    retrying = AsyncRetrying(
+        stop=stop_after_attempt(MAX_REQUEST_ATTEMPTS),
+        wait=wait_exponential(multiplier=RETRY_BACKOFF_SECONDS),
+        retry=retry_if_exception(is_transient_error),
+        before_sleep=log_retry,
+        reraise=True
+    )
+    async for attempt in retrying:
+        with attempt:
+            # Hold the semaphore per attempt so backoff sleeps don't block other fetches
+            async with semaphore:
+                async with session.get(url, params=params) as response:
+                    response.raise_for_status()
+                    return orjson.loads(await response.read())
+
+async def get_fec_contributions_bulk(employer: str, contributors: List[Contributor], session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, api_key: str, date_params: Dict[str, str]) -> Dict[str, List[Contribution]]:
+    """
+    Fetch contributions from FEC API for several contributors sharing an employer.
+    
+    A single query is issued with every contributor name, and the results are
+    grouped back onto contributors client-side. FEC reports names as
+    "LAST, FIRST", so a result matches a contributor when it contains all of
+    the contributor's name tokens (see name_matches).
+    
+    Args:
+        employer: Employer shared by all contributors (None for no filter)
+        contributors: Contributor objects to search for
+        session: Shared aiohttp session used for the request
+        semaphore: Semaphore bounding the number of in-flight FEC requests
+        api_key: FEC API key
+        date_params: Pre-formatted date filters from build_date_params
+    
+    Returns:
+        Contributions keyed by contributor name. If a request fails, the
+        contributions collected from earlier pages are still returned.
+    """
+    base_url = "https://api.open.fec.gov/v1/schedules/schedule_a/"
+    
+    params = {
+        'api_key': api_key,
+        # Repeated contributor_name values are OR'd together by the API
+        'contributor_name': [contributor.name for contributor in contributors],
+        **date_params,
         'sort': '-contribution_receipt_date',
-        'per_page': 100,
-        'is_individual': True
+        # Skip rows without a receipt date; they can't be displayed anyway
+        'sort_hide_null': 'true',
+        'per_page': FEC_PAGE_SIZE,
+        'is_individual': 'true'
     }
+    if employer:
+        params['contributor_employer'] = employer
+    
+    targets = [(contributor.name, name_tokens(contributor.name)) for contributor in contributors]
+    contributions_by_contributor = {contributor.name: [] for contributor in contributors}
     
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        contributions = []
-        for result in data['results']:
-            # Parse the load_date
-            load_date = datetime.strptime(result['load_date'], '%Y-%m-%dT%H:%M:%S')
+        previous_indexes = None
+        for page in range(1, MAX_FEC_PAGES + 1):
+            data = await fetch_json(session, semaphore, base_url, params)
             
-            # Only include contributions loaded after min_load_date
-            if load_date > min_load_date:
+            for result in data['results']:
+                result_tokens = name_tokens(result['contributor_name'] or '')
+                matches = [name for name, tokens in targets if name_matches(tokens, result_tokens)]
+                if not matches:
+                    continue
+                
+                # Parse the load_date (fromisoformat is a C fast path and also
+                # accepts the fractional seconds FEC sometimes includes)
+                load_date = datetime.fromisoformat(result['load_date'])
+                date = datetime.fromisoformat(result['contribution_receipt_date'])
+                
                 contribution = Contribution(
-                    date=datetime.strptime(result['contribution_receipt_date'], '%Y-%m-%d'),
+                    date=date,
                     amount=float(result['contribution_receipt_amount']),
                     contributor_name=result['contributor_name'],
                     employer=result['contributor_employer'] or 'Not reported',
                     committee_name=result['committee']['name'],
-                    load_date=load_date
+                    load_date=load_date,
+                    date_str=f"{date.year}-{date.month:02d}-{date.day:02d}",
+                    load_date_str=f"{load_date.year}-{load_date.month:02d}-{load_date.day:02d} "
+                                  f"{load_date.hour:02d}:{load_date.minute:02d}:{load_date.second:02d}"
                 )
-                contributions.append(contribution)
+                for name in matches:
+                    contributions_by_contributor[name].append(contribution)
+            
+            # Follow FEC's keyset pagination until the last page
+            last_indexes = data['pagination'].get('last_indexes')
+            if not last_indexes or len(data['results']) < params['per_page']:
+                break
+            if last_indexes == previous_indexes:
+                print(f"FEC pagination cursor did not advance for employer {employer}; stopping")
+                break
+            previous_indexes = last_indexes
+            params.update(last_indexes)
+        else:
+            print(f"Stopped after {MAX_FEC_PAGES} pages of FEC results for employer {employer}")
         
-        return contributions
+        return contributions_by_contributor
     
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching FEC data for {contributor.name}: {str(e)}")
-        return []
+    except (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError) as e:
+        # Keep whatever earlier pages yielded rather than dropping the whole group
+        print(f"Error fetching FEC data for employer {employer}: {str(e)}")
+        return contributions_by_contributor
 
 def format_email_body(contributions_by_contributor: Dict[str, List[Contribution]]) -> str:
-    """Format contribution data into an HTML email body."""
-    html = "<html><body>"
-    html += "<h2>FEC Contribution Alert</h2>"
+    """
+    Format contribution data into an HTML email body.
+    
+    Callers should only pass contributors that have contributions.
+    """
+    parts = []
+    append = parts.append
+    append("<html><body>")
+    append("<h2>FEC Contribution Alert</h2>")
     
     for contributor, contributions in contributions_by_contributor.items():
-        if contributions:
-            html += f"<h3>Contributions from {contributor}</h3>"
-            html += "<table border='1' style='border-collapse: collapse; width: 100%;'>"
-            html += "<tr><th>Date</th><th>Amount</th><th>Committee</th><th>Employer</th></tr>"
-            
-            for contribution in contributions:
-                html += f"""
-                <tr>
-                    <td>{contribution.date.strftime('%Y-%m-%d')}</td>
-                    <td>${contribution.amount:,.2f}</td>
-                    <td>{contribution.committee_name}</td>
-                    <td>{contribution.employer}</td>
-                    <td>{contribution.load_date.strftime('%Y-%m-%d %H:%M:%S')}</td>
-                </tr>
-                """
-            html += "</table><br>"
-        else:
-            html += f"<p>No recent contributions found for {contributor}</p><br>"
+        append(f"<h3>Contributions from {contributor}</h3>")
+        append("<table border='1' style='border-collapse: collapse; width: 100%;'>")
+        append("<tr><th>Date</th><th>Amount</th><th>Committee</th><th>Employer</th><th>Loaded</th></tr>")
+        
+        for contribution in contributions:
+            append(ROW_TEMPLATE.format(
+                contribution.date_str,
+                contribution.amount,
+                contribution.committee_name,
+                contribution.employer,
+                contribution.load_date_str
+            ))
+        append("</table><br>")
+    
+    append("</body></html>")
+    return "".join(parts)
+
+class SmtpSession:
+    """
+    SMTP connection that is opened once and reused for every message sent.
     
-    html += "</body></html>"
-    return html
+    The connection is health-checked with NOOP before reuse and rotated after
+    max_messages messages so long runs don't hold a single connection forever.
+    """
+
+    def __init__(self, smtp_config: dict, max_messages: int = MAX_MESSAGES_PER_SMTP_CONNECTION):
+        self.smtp_config = smtp_config
+        self.max_messages = max_messages
+        self._server = None
+        self._sent = 0
 
-def send_email(to_email: str, subject: str, html_content: str, smtp_config: dict):
-    """Send an HTML email using SMTP."""
+    def __enter__(self):
+        self._connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def from_email(self) -> str:
+        return self.smtp_config['from_email']
+
+    def _connect(self):
+        server = smtplib.SMTP(self.smtp_config['server'], self.smtp_config['port'])
+        try:
+            server.starttls()
+            server.login(self.smtp_config['username'], self.smtp_config['password'])
+        except BaseException:
+            # __exit__ won't run if this fails inside __enter__, so don't leak the socket
+            server.close()
+            raise
+        self._server = server
+        self._sent = 0
+
+    def _is_alive(self) -> bool:
+        try:
+            return self._server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send_message(self, msg: MIMEMultipart):
+        """Send a message, reconnecting first if the connection is stale or used up."""
+        if self._server is None or self._sent >= self.max_messages or (self._sent and not self._is_alive()):
+            self.close()
+            self._connect()
+        self._server.send_message(msg)
+        self._sent += 1
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+def send_email(to_email: str, subject: str, html_content: str, smtp_session: SmtpSession):
+    """Send an HTML email over an open SMTP session."""
     msg = MIMEMultipart('alternative')
     msg['Subject'] = subject
-    msg['From'] = smtp_config['from_email']
+    msg['From'] = smtp_session.from_email
     msg['To'] = to_email
     
     html_part = MIMEText(html_content, 'html')
     msg.attach(html_part)
     
     try:
-        with smtplib.SMTP(smtp_config['server'], smtp_config['port']) as server:
-            server.starttls()
-            server.login(smtp_config['username'], smtp_config['password'])
-            server.send_message(msg)
+        smtp_session.send_message(msg)
     except Exception as e:
         print(f"Error sending email: {str(e)}")
         raise
 
+async def fetch_all_contributions(contributors: List[Contributor], api_key: str, date_params: Dict[str, str]) -> Dict[str, List[Contribution]]:
+    """Fetch contributions for all contributors, one concurrent query per employer."""
+    contributors_by_employer = {}
+    for contributor in contributors:
+        contributors_by_employer.setdefault(contributor.employer, []).append(contributor)
+    
+    # Bound concurrency so bursts don't trip the FEC API rate limit
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS)
+    # One pooled session per run so keep-alive connections (and their TLS
+    # handshakes) are reused across all contributor fetches
+    connector = aiohttp.TCPConnector(limit=CONNECTION_POOL_SIZE, ttl_dns_cache=DNS_CACHE_TTL_SECONDS)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = [
+            get_fec_contributions_bulk(employer, group, session, semaphore, api_key, date_params)
+            for employer, group in contributors_by_employer.items()
+        ]
+        results = await asyncio.gather(*tasks)
+
+    # Merge per-employer results back into the original contributor order
+    merged = {}
+    for result in results:
+        merged.update(result)
+    return {contributor.name: merged[contributor.name] for contributor in contributors}
+
 @functions_framework.http
 def monitor_contributions(request: Request):
     """Cloud Function entry point to monitor FEC contributions."""
@@ -151,8 +368,7 @@ def monitor_contributions(request: Request):
         notification_email = os.environ['NOTIFICATION_EMAIL']
         
         # Get secrets
-        fec_api_key = get_secret('fec-api-key')
-        smtp_password = get_secret('smtp-password')
+        fec_api_key, smtp_password = asyncio.run(get_secrets('fec-api-key', 'smtp-password'))
         
         # SMTP configuration
         smtp_config = {
@@ -204,19 +420,25 @@ def monitor_contributions(request: Request):
             # Add more contributors as needed
         ]
         
-        # Fetch contributions for each contributor
-        contributions_by_contributor = {}
-        for contributor in contributors:
-            print(f"getting contributions for {contributor.name}")
-            contributions = get_fec_contributions(contributor, fec_api_key)
-            contributions_by_contributor[contributor.name] = contributions
+        # Fetch contributions for all contributors concurrently
+        print(f"getting contributions for {len(contributors)} contributors")
+        date_params = build_date_params()
+        contributions_by_contributor = asyncio.run(fetch_all_contributions(contributors, fec_api_key, date_params))
+        
+        # Only contributors with new contributions appear in the email
+        contributions_by_contributor = {
+            contributor: contributions
+            for contributor, contributions in contributions_by_contributor.items()
+            if contributions
+        }
         
         # Format and send email if there are any contributions
-        if any(contributions_by_contributor.values()):
+        if contributions_by_contributor:
             print("preparing to send email")
             html_content = format_email_body(contributions_by_contributor)
             subject = f"FEC Contribution Alert - {datetime.now().strftime('%Y-%m-%d')}"
-            send_email(notification_email, subject, html_content, smtp_config)
+            with SmtpSession(smtp_config) as smtp_session:
+                send_email(notification_email, subject, html_content, smtp_session)
             return "Alert sent successfully", 200
         else:
             return "No new contributions found", 200